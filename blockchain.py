@@ -1,6 +1,10 @@
 import os
 import requests
-import json
+from typing import BinaryIO
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
 from solders.keypair import Keypair
 from solders.pubkey import Pubkey
 from solders.transaction import VersionedTransaction
@@ -8,7 +12,45 @@ from solders.commitment_config import CommitmentLevel
 from solders.rpc.requests import SendVersionedTransaction
 from solders.rpc.config import RpcSendTransactionConfig
 
-def create_tx(name: str, symbol: str, description: str, image_data: bytes, amount: float, user_public_key: Pubkey) -> tuple[VersionedTransaction, Keypair] | None:
+# (connect, read) timeouts so a hung upstream can't hold a worker thread forever.
+# With the retries below, a single call is bounded by 3 attempts x (3s + 15s)
+# plus under a second of backoff, roughly 55s worst case.
+_CONN_T, _READ_T = 3.0, 15.0
+
+def _make_session(retry: Retry) -> requests.Session:
+    # Shared session so repeated calls to the same hosts reuse pooled
+    # keep-alive connections instead of paying a new TLS handshake each time
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=retry))
+    # Ask for every compression urllib3 can decode here (gzip/deflate, plus br and
+    # zstd when their packages are installed) and keep sockets open explicitly
+    session.headers.update({
+        'Accept-Encoding': make_headers(accept_encoding=True)['accept-encoding'],
+        'Connection': 'keep-alive'
+    })
+    return session
+
+# IPFS upload and trade-local are safe to repeat, so retry them on 429/5xx.
+# urllib3's default allowed_methods excludes POST, so without setting it here
+# status_forcelist would never fire for these calls.
+# Retry-After is ignored: urllib3 would sleep for whatever the upstream asks,
+# outside both the timeouts and the retry count.
+_SESSION = _make_session(Retry(
+    total=2,
+    backoff_factor=0.3,
+    status_forcelist=[429, 502, 503, 504],
+    allowed_methods=frozenset(['POST']),
+    respect_retry_after_header=False,
+    raise_on_status=False
+))
+
+# sendTransaction is not: if the first send reached the node and only the
+# response was lost, a resend fails preflight as "already processed" and the
+# landed transaction would be reported as a failure. Only retry connection
+# errors, where the request never left this process.
+_RPC_SESSION = _make_session(Retry(total=2, read=0, status=0, backoff_factor=0.3))
+
+def create_tx(name: str, symbol: str, description: str, image_stream: BinaryIO, amount: float, user_public_key: Pubkey) -> tuple[bytes, VersionedTransaction, Keypair] | None:
     # Generate a random keypair for token
     mint_keypair = Keypair()
 
@@ -19,18 +61,42 @@ def create_tx(name: str, symbol: str, description: str, image_data: bytes, amoun
         'description': description,
     }
 
+    # requests reads the whole stream to build the multipart body in memory,
+    # so this is not a streaming upload
     files = {
-        'file': (f'{symbol}.png', image_data, 'image/png')
+        'file': (f'{symbol}.png', image_stream, 'image/png')
+    }
+
+    # Fixed part of the create request, prepared before the IPFS upload
+    trade_body = {
+        'publicKey': str(user_public_key),
+        'action': 'create',
+        'mint': str(mint_keypair.pubkey()),
+        'denominatedInSol': 'true',
+        'amount': str(amount),
+        'slippage': 10,
+        'priorityFee': 0.0005,
+        'pool': 'pump',
+        'isMayhemMode': 'false'
     }
 
     # Create IPFS metadata storage
-    metadata_response = requests.post("https://pump.fun/api/ipfs", data=form_data, files=files)
+    try:
+        metadata_response = _SESSION.post(
+            "https://pump.fun/api/ipfs",
+            data=form_data,
+            files=files,
+            timeout=(_CONN_T, _READ_T)
+        )
+    except requests.RequestException as e:
+        print(f"IPFS upload failed: {e}")
+        return None
     if metadata_response.status_code != 200:
         print(f"IPFS upload failed: {metadata_response.status_code} - {metadata_response.text}")
         return None
     try:
-        metadata_response_json = metadata_response.json()
-    except json.JSONDecodeError as e:
+        metadata_response_json = orjson.loads(metadata_response.content)
+    except orjson.JSONDecodeError as e:
         print(f"Failed to parse IPFS response JSON: {e}")
         return None
     
@@ -41,23 +107,19 @@ def create_tx(name: str, symbol: str, description: str, image_data: bytes, amoun
         'uri': metadata_response_json['metadataUri']
     }
 
+    trade_body['tokenMetadata'] = token_metadata
+
     # Send the create transaction
-    response = requests.post(
-        f"https://pumpportal.fun/api/trade-local",
-        headers={'Content-Type': 'application/json'},
-        data=json.dumps({
-            'publicKey': str(user_public_key),
-            'action': 'create',
-            'tokenMetadata': token_metadata,
-            'mint': str(mint_keypair.pubkey()),
-            'denominatedInSol': 'true',
-            'amount': str(amount),
-            'slippage': 10,
-            'priorityFee': 0.0005,
-            'pool': 'pump',
-            'isMayhemMode': 'false'
-        })
-    )
+    try:
+        response = _SESSION.post(
+            f"https://pumpportal.fun/api/trade-local",
+            headers={'Content-Type': 'application/json'},
+            data=orjson.dumps(trade_body),
+            timeout=(_CONN_T, _READ_T)
+        )
+    except requests.RequestException as e:
+        print(f"Error: trade-local request failed - {e}")
+        return None
     
     print(f"Status code: {response.status_code}")
     print(f"Response: {response.text}")
@@ -69,9 +131,10 @@ def create_tx(name: str, symbol: str, description: str, image_data: bytes, amoun
     # Get the unsigned transaction
     unsigned_tx = VersionedTransaction.from_bytes(response.content)
     
-    # Return unsigned transaction and mint keypair
-    # Both need to be signed later
-    return (unsigned_tx, mint_keypair)
+    # Return the raw transaction bytes, unsigned transaction and mint keypair
+    # The raw bytes let callers re-encode without serializing unsigned_tx again
+    # The transaction needs to be signed later by both keypairs
+    return (response.content, unsigned_tx, mint_keypair)
 
 def sign_tx(tx: VersionedTransaction, mint_keypair: Keypair, user_keypair: Keypair) -> VersionedTransaction:
     # Sign the transaction with both keypairs
@@ -84,18 +147,23 @@ def sign_tx(tx: VersionedTransaction, mint_keypair: Keypair, user_keypair: Keypa
 def broadcast_tx(tx: VersionedTransaction) -> str | None:
     commitment = CommitmentLevel.Confirmed
     config = RpcSendTransactionConfig(preflight_commitment=commitment)
-    txPayload = SendVersionedTransaction(tx, config)
+    payload_json = SendVersionedTransaction(tx, config).to_json()
 
-    response = requests.post(
-        url="https://api.mainnet-beta.solana.com/",
-        headers={"Content-Type": "application/json"},
-        data=SendVersionedTransaction(tx, config).to_json()
-    )
+    try:
+        response = _RPC_SESSION.post(
+            url="https://api.mainnet-beta.solana.com/",
+            headers={"Content-Type": "application/json"},
+            data=payload_json,
+            timeout=(_CONN_T, _READ_T)
+        )
+    except requests.RequestException as e:
+        print(f"Error: broadcast request failed - {e}")
+        return None
     if response.status_code != 200:
         print(f"Error: HTTP {response.status_code} - {response.text}")
         return None
     
-    response_json = response.json()
+    response_json = orjson.loads(response.content)
     print(f"Broadcast response: {response_json}")
     
     if 'error' in response_json:
@@ -126,12 +194,11 @@ def broadcast_tx(tx: VersionedTransaction) -> str | None:
     return txSignature
 
 if __name__ == "__main__":
-    with open('./example.png', 'rb') as f:
-        image_data = f.read()
     kp = Keypair.from_base58_string("private_key")
-    result = create_tx("example", "EX", "This is an example", image_data, 0, kp.pubkey())
+    with open('./example.png', 'rb') as f:
+        result = create_tx("example", "EX", "This is an example", f, 0, kp.pubkey())
     if result:
-        tx, mint_kp = result
+        _, tx, mint_kp = result
         tx = sign_tx(tx, mint_kp, kp)
         broadcast_tx(tx)
     else:
@@ -5,47 +5,132 @@ Also provides endpoints for creating and broadcasting transactions.
 """
 
 import os
-import base64
+import hashlib
+import logging
+import pybase64
 import requests
-import base58
 import uuid
 import time
+import orjson
+from functools import lru_cache
 from flask import Flask, request, jsonify, Response
+from flask.json.provider import JSONProvider
 from flask_cors import CORS, cross_origin
 from solders.keypair import Keypair
 from solders.pubkey import Pubkey
 from solders.transaction import VersionedTransaction
-from blockchain import create_tx, broadcast_tx
+from blockchain import create_tx, sign_tx, broadcast_tx
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 # In-memory storage for images (token -> {image_data, timestamp})
 # In production, consider using Redis or similar
 image_cache = {}
 IMAGE_CACHE_TTL = 3600  # 1 hour
 
+# /create_and_broadcast accepts raw private keys, so it is only registered
+# when explicitly enabled (ENABLE_SERVER_SIGNING=true)
+ENABLE_SERVER_SIGNING = os.environ.get('ENABLE_SERVER_SIGNING', 'False').lower() == 'true'
+SERVER_SIGNING_PATH = '/create_and_broadcast'
+
 def cleanup_old_images():
     """Remove images older than TTL"""
     current_time = time.time()
+    # Snapshot the items since other request threads may modify the cache
     tokens_to_remove = [
-        token for token, data in image_cache.items()
+        token for token, data in list(image_cache.items())
         if current_time - data['timestamp'] > IMAGE_CACHE_TTL
     ]
     for token in tokens_to_remove:
-        del image_cache[token]
-# Enable CORS for all routes with explicit configuration
+        image_cache.pop(token, None)
+# Enable CORS for all routes with explicit configuration,
+# except the server-signing route, so cross-origin pages can't read its response.
+# A multipart POST needs no preflight, so the handler also rejects foreign Origins.
 CORS(app, 
      resources={
-         r"/*": {
+         r"^/(?!create_and_broadcast$).*": {
              "origins": "*",
              "methods": ["GET", "POST", "OPTIONS"],
              "allow_headers": ["Content-Type", "Authorization"]
          }
      })
 
+@lru_cache(maxsize=None)
+def load_static_file(filename):
+    """Read a file next to this module once and return (content, etag)"""
+    path = os.path.join(os.path.dirname(__file__), filename)
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    etag = hashlib.blake2b(content.encode('utf-8'), digest_size=8).hexdigest()
+    return content, etag
+
+def inject_example_html(server_url, base64_image_js):
+    """Insert the server URL and optional image into example.html"""
+    html_content, _ = load_static_file('example.html')
+    
+    # Replace the placeholder or hardcoded server URL in the HTML
+    # We'll inject it as a script variable before the PumpFunClient initialization
+    injection_script = f'''
+    <script>
+        // Server URL injected by server
+        window.SERVER_URL = '{server_url}';
+        // Base64 image from token (if provided)
+        window.BASE64_IMAGE = {base64_image_js};
+    </script>
+'''
+    
+    # Insert the script right before the closing </head> tag
+    return html_content.replace('</head>', injection_script + '</head>')
+
+@lru_cache(maxsize=8)
+def render_example_html(server_url):
+    """Render example.html without an image, memoized per server URL"""
+    html_content = inject_example_html(server_url, 'null')
+    etag = hashlib.blake2b(html_content.encode('utf-8'), digest_size=8).hexdigest()
+    return html_content, etag
+
+def get_server_url():
+    """Build this server's URL (origin) from the current request"""
+    # Check for forwarded protocol header (Railway sets this)
+    forwarded_proto = request.headers.get('X-Forwarded-Proto', '')
+    scheme = 'https' if forwarded_proto == 'https' else request.scheme
+    
+    # Build the server URL with the correct scheme
+    return f"{scheme}://{request.host}".rstrip('/')
+
+@lru_cache(maxsize=4096)
+def parse_pubkey(pubkey_str):
+    """Parse a base58 public key, memoized since clients reuse the same wallet"""
+    # Invalid keys raise and lru_cache does not cache exceptions
+    return Pubkey.from_string(pubkey_str)
+
+def conditional_response(content, etag, mimetype, vary=()):
+    """Build a cacheable response, answering 304 if the client's ETag matches"""
+    response = Response(content, mimetype=mimetype)
+    response.set_etag(etag)
+    response.vary.update(vary)
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response.make_conditional(request)
+
 # Ensure CORS headers are added to all responses, including errors
 @app.after_request
 def after_request(response):
+    if request.path == SERVER_SIGNING_PATH:
+        return response
     response.headers.add('Access-Control-Allow-Origin', '*')
     response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
@@ -55,18 +140,7 @@ def after_request(response):
 def serve_example():
     """Serve the example HTML page with server URL injected."""
     try:
-        # Read the example.html file
-        html_path = os.path.join(os.path.dirname(__file__), 'example.html')
-        with open(html_path, 'r', encoding='utf-8') as f:
-            html_content = f.read()
-        
-        # Get the server URL from the request
-        # Check for forwarded protocol header (Railway sets this)
-        forwarded_proto = request.headers.get('X-Forwarded-Proto', '')
-        scheme = 'https' if forwarded_proto == 'https' else request.scheme
-        
-        # Build the server URL with the correct scheme
-        server_url = f"{scheme}://{request.host}".rstrip('/')
+        server_url = get_server_url()
         
         # Check for image token in query parameters
         image_token = request.args.get('image_token', '')
@@ -80,27 +154,17 @@ def serve_example():
             # If token not found or expired, base64_image remains None
         
         # Escape quotes in base64_image for safe JavaScript injection
-        base64_image_js = 'null'
         if base64_image:
             # Escape quotes and newlines for safe JavaScript string
             escaped_image = base64_image.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
             base64_image_js = f'"{escaped_image}"'
+            # Pages carrying a cached image are one-off, so skip memoization
+            html_content = inject_example_html(server_url, base64_image_js)
+            return html_content, 200, {'Content-Type': 'text/html; charset=utf-8'}
         
-        # Replace the placeholder or hardcoded server URL in the HTML
-        # We'll inject it as a script variable before the PumpFunClient initialization
-        injection_script = f'''
-    <script>
-        // Server URL injected by server
-        window.SERVER_URL = '{server_url}';
-        // Base64 image from token (if provided)
-        window.BASE64_IMAGE = {base64_image_js};
-    </script>
-'''
-        
-        # Insert the script right before the closing </head> tag
-        html_content = html_content.replace('</head>', injection_script + '</head>')
-        
-        return html_content, 200, {'Content-Type': 'text/html; charset=utf-8'}
+        html_content, etag = render_example_html(server_url)
+        # window.SERVER_URL depends on these headers, so shared caches must key on them
+        return conditional_response(html_content, etag, 'text/html', vary=('Host', 'X-Forwarded-Proto'))
     except Exception as e:
         return jsonify({'error': f'Failed to serve page: {str(e)}'}), 500
 
@@ -109,10 +173,8 @@ def serve_example():
 def serve_client_js():
     """Serve the pumpfun-client.js file."""
     try:
-        js_path = os.path.join(os.path.dirname(__file__), 'pumpfun-client.js')
-        with open(js_path, 'r', encoding='utf-8') as f:
-            js_content = f.read()
-        return js_content, 200, {'Content-Type': 'application/javascript; charset=utf-8'}
+        js_content, etag = load_static_file('pumpfun-client.js')
+        return conditional_response(js_content, etag, 'application/javascript')
     except Exception as e:
         return jsonify({'error': f'Failed to serve JavaScript file: {str(e)}'}), 500
 
@@ -155,49 +217,43 @@ def upload_image():
         return jsonify({'error': f'Failed to upload image: {str(e)}'}), 500
 
 
+# Pre-serialized so frequent load balancer probes skip JSON encoding
+HEALTH_RESPONSE = (b'{"status":"healthy"}', 200, {'Content-Type': 'application/json'})
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
-    return jsonify({'status': 'healthy'}), 200
+    return Response(*HEALTH_RESPONSE)
 
 
-@app.route('/create_tx', methods=['POST'])
-def create_transaction():
+def parse_token_form():
     """
-    Create an unsigned transaction for token creation.
-    Accepts: name, symbol, description, image (file), amount (optional), user_public_key
-    Returns: unsigned_tx (base64), mint_keypair (base58), mint_public_key (string)
+    Validate the token fields shared by /create_tx and /create_and_broadcast.
+    Returns (fields, None) on success or (None, error_response) on failure.
     """
     # Validate required fields
     if 'name' not in request.form:
-        return jsonify({'error': 'Missing required field: name'}), 400
+        return None, (jsonify({'error': 'Missing required field: name'}), 400)
     
     if 'symbol' not in request.form:
-        return jsonify({'error': 'Missing required field: symbol'}), 400
+        return None, (jsonify({'error': 'Missing required field: symbol'}), 400)
     
     if 'image' not in request.files:
-        return jsonify({'error': 'Missing required field: image'}), 400
-    
-    if 'user_public_key' not in request.form:
-        return jsonify({'error': 'Missing required field: user_public_key'}), 400
+        return None, (jsonify({'error': 'Missing required field: image'}), 400)
     
     # Extract and validate data
     name = request.form.get('name', '').strip()
     symbol = request.form.get('symbol', '').strip()
     description = request.form.get('description', '').strip() if 'description' in request.form else ''
     amount = request.form.get('amount', '0').strip()  # Default to 0 if not provided
-    user_public_key_str = request.form.get('user_public_key', '').strip()
     image_file = request.files['image']
     
     # Validate that required fields are not empty
     if not name:
-        return jsonify({'error': 'Name cannot be empty'}), 400
+        return None, (jsonify({'error': 'Name cannot be empty'}), 400)
     
     if not symbol:
-        return jsonify({'error': 'Symbol cannot be empty'}), 400
-    
-    if not user_public_key_str:
-        return jsonify({'error': 'User public key cannot be empty'}), 400
+        return None, (jsonify({'error': 'Symbol cannot be empty'}), 400)
     
     # Amount is optional - default to 0 if empty
     if not amount:
@@ -206,36 +262,66 @@ def create_transaction():
         try:
             amount_float = float(amount)
             if amount_float < 0:
-                return jsonify({'error': 'Amount cannot be negative'}), 400
+                return None, (jsonify({'error': 'Amount cannot be negative'}), 400)
         except ValueError:
-            return jsonify({'error': 'Amount must be a valid number'}), 400
+            return None, (jsonify({'error': 'Amount must be a valid number'}), 400)
+    
+    # Pass the upload's file object on and peek one byte to reject empty images
+    image_stream = image_file.stream
+    if not image_stream.read(1):
+        return None, (jsonify({'error': 'Image file is empty'}), 400)
+    image_stream.seek(0)
+    
+    return {
+        'name': name,
+        'symbol': symbol,
+        'description': description,
+        'image_stream': image_stream,
+        'amount': amount_float
+    }, None
+
+
+@app.route('/create_tx', methods=['POST'])
+def create_transaction():
+    """
+    Create an unsigned transaction for token creation.
+    Accepts: name, symbol, description, image (file), amount (optional), user_public_key
+    Returns: unsigned_tx (base64), mint_keypair (base58), mint_public_key (string)
+    """
+    fields, error = parse_token_form()
+    if error:
+        return error
+    
+    if 'user_public_key' not in request.form:
+        return jsonify({'error': 'Missing required field: user_public_key'}), 400
+    
+    user_public_key_str = request.form.get('user_public_key', '').strip()
+    
+    if not user_public_key_str:
+        return jsonify({'error': 'User public key cannot be empty'}), 400
     
     try:
-        user_public_key = Pubkey.from_string(user_public_key_str)
+        user_public_key = parse_pubkey(user_public_key_str)
     except Exception as e:
         return jsonify({'error': f'Invalid user public key: {str(e)}'}), 400
     
-    # Read image data
     try:
-        image_data = image_file.read()
-        if not image_data:
-            return jsonify({'error': 'Image file is empty'}), 400
-        
         # Create the transaction
-        result = create_tx(name, symbol, description, image_data, amount_float, user_public_key)
+        result = create_tx(
+            fields['name'], fields['symbol'], fields['description'],
+            fields['image_stream'], fields['amount'], user_public_key
+        )
         
         if result is None:
             return jsonify({'error': 'Failed to create transaction'}), 500
         
-        unsigned_tx, mint_keypair = result
+        tx_bytes, _, mint_keypair = result
         
         # Serialize the transaction and keypair for client
-        tx_bytes = bytes(unsigned_tx)
-        tx_base64 = base64.b64encode(tx_bytes).decode('utf-8')
+        tx_base64 = pybase64.b64encode_as_string(tx_bytes)
         # Convert full keypair to base58 (64 bytes)
         # JavaScript Keypair.fromSecretKey() expects the full 64-byte keypair
-        mint_keypair_bytes = bytes(mint_keypair)
-        mint_keypair_base58 = base58.b58encode(mint_keypair_bytes).decode('utf-8')
+        mint_keypair_base58 = mint_keypair.to_base58_string()
         mint_public_key = str(mint_keypair.pubkey())
         
         return jsonify({
@@ -244,13 +330,72 @@ def create_transaction():
             'mint_public_key': mint_public_key
         }), 200
     except Exception as e:
-        # Log the error for debugging
-        import traceback
-        print(f"Error creating transaction: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("create_tx failed")
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 
+def create_and_broadcast_transaction():
+    """
+    Create, sign and broadcast a token creation transaction in one request.
+    For server-side signing flows where the client holds a hot-wallet keypair.
+    Accepts: name, symbol, description, image (file), amount (optional), user_keypair (base58)
+    Returns: transaction signature, transaction URL and mint_public_key (string)
+    """
+    # A cross-origin form POST is a CORS simple request and reaches this handler
+    # without a preflight, so reject any Origin other than this server's own
+    origin = request.headers.get('Origin')
+    if origin and origin != get_server_url():
+        return jsonify({'error': 'Cross-origin requests are not allowed'}), 403
+    
+    fields, error = parse_token_form()
+    if error:
+        return error
+    
+    if 'user_keypair' not in request.form:
+        return jsonify({'error': 'Missing required field: user_keypair'}), 400
+    
+    user_keypair_str = request.form.get('user_keypair', '').strip()
+    
+    if not user_keypair_str:
+        return jsonify({'error': 'User keypair cannot be empty'}), 400
+    
+    try:
+        user_keypair = Keypair.from_base58_string(user_keypair_str)
+    except Exception:
+        # Never echo the secret back in the error message
+        return jsonify({'error': 'Invalid user keypair'}), 400
+    
+    try:
+        result = create_tx(
+            fields['name'], fields['symbol'], fields['description'],
+            fields['image_stream'], fields['amount'], user_keypair.pubkey()
+        )
+        
+        if result is None:
+            return jsonify({'error': 'Failed to create transaction'}), 500
+        
+        _, unsigned_tx, mint_keypair = result
+        signed_tx = sign_tx(unsigned_tx, mint_keypair, user_keypair)
+        
+        tx_signature = broadcast_tx(signed_tx)
+        
+        if tx_signature is None:
+            return jsonify({'error': 'Failed to broadcast transaction'}), 500
+        
+        return jsonify({
+            'status': 'success',
+            'signature': tx_signature,
+            'transaction_url': f'https://solscan.io/tx/{tx_signature}',
+            'mint_public_key': str(mint_keypair.pubkey())
+        }), 200
+    except Exception as e:
+        logger.exception("create_and_broadcast failed")
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+if ENABLE_SERVER_SIGNING:
+    app.add_url_rule(SERVER_SIGNING_PATH, view_func=create_and_broadcast_transaction, methods=['POST'])
+
+
 @app.route('/broadcast_tx', methods=['POST'])
 def broadcast_transaction():
     """
@@ -273,7 +418,7 @@ def broadcast_transaction():
     
     try:
         # Deserialize the signed transaction
-        tx_bytes = base64.b64decode(signed_tx_base64)
+        tx_bytes = pybase64.b64decode(signed_tx_base64, validate=True)
         signed_tx = VersionedTransaction.from_bytes(tx_bytes)
     except Exception as e:
         return jsonify({'error': f'Invalid transaction data: {str(e)}'}), 400